@@ -1,22 +1,89 @@
-from sqlmodel import SQLModel, create_engine, Session, Field
+from sqlmodel import SQLModel, Field
+from sqlmodel.ext.asyncio.session import AsyncSession
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 from typing import Optional
 from datetime import datetime
 import os
 from dotenv import load_dotenv
 
 load_dotenv()
+
+
+def _async_url(url: str) -> str:
+    # The engine is async, so plain sqlite URLs are routed through the aiosqlite driver.
+    if url.startswith("sqlite:"):
+        return url.replace("sqlite:", "sqlite+aiosqlite:", 1)
+    return url
+
+
 # Retrieves the SQLite connection string. SQLite creates the database file automatically.
-DATABASE_URL = os.getenv("DATABASE_URL") or "sqlite:///./sql_app.db"
+DATABASE_URL = _async_url(os.getenv("DATABASE_URL") or "sqlite:///./sql_app.db")
+
+# SQL statement logging is off by default; set SQL_ECHO=1 to enable it while debugging.
+SQL_ECHO = os.getenv("SQL_ECHO") == "1"
+
+# SQLite tuning applied to every new connection: WAL lets readers (e.g. the admin panel)
+# run alongside the subscribe writer, and synchronous=NORMAL avoids an fsync per commit.
+SQLITE_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA mmap_size=268435456",
+    "PRAGMA cache_size=-64000",
+    "PRAGMA busy_timeout=5000",
+)
+
+
+def _set_sqlite_pragma(dbapi_conn, _):
+    cursor = dbapi_conn.cursor()
+    for pragma in SQLITE_PRAGMAS:
+        cursor.execute(pragma)
+    cursor.close()
+
+
+def _optimize_sqlite(dbapi_conn, _):
+    # Let SQLite refresh its query planner statistics as pooled connections are closed.
+    try:
+        cursor = dbapi_conn.cursor()
+        cursor.execute("PRAGMA optimize")
+        cursor.close()
+    except Exception:
+        pass
+
+
+def _create_engine(url: str):
+    is_sqlite = url.startswith("sqlite")
+    # Keep connections (and SQLite's page cache) alive across requests instead of reconnecting each time.
+    # A local SQLite file never drops idle connections, so pinging or recycling them would only
+    # throw away a warm cache; those are kept for server-backed databases.
+    new_engine = create_async_engine(
+        url,
+        echo=SQL_ECHO,
+        poolclass=AsyncAdaptedQueuePool,
+        pool_size=10,
+        max_overflow=20,
+        pool_pre_ping=not is_sqlite,
+        pool_recycle=-1 if is_sqlite else 3600,
+    )
+    if is_sqlite:
+        event.listen(new_engine.sync_engine, "connect", _set_sqlite_pragma)
+        event.listen(new_engine.sync_engine, "close", _optimize_sqlite)
+    return new_engine
+
+
+engine = _create_engine(DATABASE_URL)
 
-engine = create_engine(DATABASE_URL, echo=True)
 
-def create_db_and_tables():
+async def create_db_and_tables():
     """Initializes the database and creates all tables."""
-    SQLModel.metadata.create_all(engine)
+    async with engine.begin() as conn:
+        await conn.run_sync(SQLModel.metadata.create_all)
 
-def get_session():
-    """Dependency for FastAPI to get a database session."""
-    with Session(engine) as session:
+async def get_session():
+    """Dependency for FastAPI to get an async database session."""
+    async with AsyncSession(engine, expire_on_commit=False) as session:
         yield session
 
 class Subscriber(SQLModel, table=True):
@@ -24,7 +91,7 @@ class Subscriber(SQLModel, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
     email: str = Field(unique=True, index=True)
     is_active: bool = Field(default=True)
-    date_subscribed: datetime = Field(default_factory=datetime.utcnow) 
+    date_subscribed: datetime = Field(default_factory=datetime.utcnow)
     
     __admin_label__ = "Subscriber Management" 
 
@@ -1,14 +1,18 @@
 from fastapi import FastAPI, Depends, BackgroundTasks, HTTPException, WebSocket
 from fastapi.middleware.cors import CORSMiddleware
+from starlette.concurrency import run_in_threadpool
 from starlette.requests import Request
 from starlette.responses import HTMLResponse
 from starlette.staticfiles import StaticFiles
-from sqlmodel import Session, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+from sqlalchemy.exc import IntegrityError
 from datetime import datetime
 import threading
+import base64
+import hmac
 import asyncio
 import time
-import json
+import orjson
 import os
 import logging
 
@@ -18,7 +22,15 @@ try:
 except Exception:
     tweepy = None
 
+# optional: celery only used when REDIS_URL is set, to send mail outside the web worker
+try:
+    from celery import Celery
+except Exception:
+    Celery = None
+
 from fastapi_mail import FastMail, MessageSchema, ConnectionConfig
+from fastapi_mail.errors import ConnectionErrors
+import aiosmtplib
 # starlette-admin imports may fail at runtime depending on versions
 try:
     from starlette_admin.contrib.sqlmodel import Admin, ModelView
@@ -46,6 +58,7 @@ MAIL_TLS = os.getenv("MAIL_TLS", "True").lower() == 'true'
 MAIL_SSL = os.getenv("MAIL_SSL", "False").lower() == 'true'
 USE_CREDENTIALS = os.getenv("USE_CREDENTIALS", "True").lower() == 'true'
 VALIDATE_CERTS = os.getenv("VALIDATE_CERTS", "True").lower() == 'true'
+REDIS_URL = os.getenv("REDIS_URL")
 
 # --- Configuration for FastAPI-Mail ---
 conf = None
@@ -74,8 +87,15 @@ else:
         logger.exception("Failed to build ConnectionConfig: %s", e)
         conf = None
 
+# one shared mail client, built once instead of per send
+fm = FastMail(conf) if conf else None
+
 
 # --- Basic Admin Authentication (lightweight) ---
+# replace with real auth in production
+ADMIN_CREDENTIALS = b"admin_analyze:strong_password_123"
+
+
 class CustomAuthBackend:
     def __init__(self, login_url: str = "/admin/login"):
         self.login_url = login_url
@@ -85,14 +105,12 @@ class CustomAuthBackend:
         if not auth_header or not auth_header.startswith("Basic "):
             return False
         try:
-            import base64
             encoded = auth_header.split(" ")[1]
-            decoded = base64.b64decode(encoded).decode("utf-8")
-            username, password = decoded.split(":", 1)
+            decoded = base64.b64decode(encoded)
         except Exception:
             return False
-        # replace with real auth in production
-        return username == "admin_analyze" and password == "strong_password_123"
+        # constant-time compare to avoid leaking credentials through timing
+        return hmac.compare_digest(decoded, ADMIN_CREDENTIALS)
 
 
 # --- App Initialization ---
@@ -135,54 +153,97 @@ else:
 
 
 # --- Email sending helper ---
-async def send_welcome_email(recipient_email: str):
-    if not conf:
-        logger.warning("Skipping email send because ConnectionConfig is not configured.")
-        return
+# static welcome email body, built once at import time
+WELCOME_BODY = """
+    <p>Dear Subscriber,</p>
 
-    message = MessageSchema(
-        subject="Welcome to Analyze India 🚀 — Your Insights Start Now!",
-        recipients=[recipient_email],
-        body=f"""
-            <p>Dear Subscriber,</p>
+    <p>Thank you for joining <strong>Analyze India</strong>! Your subscription is now active, and you're officially part of a community driven by data, intelligence, and innovation.</p>
 
-            <p>Thank you for joining <strong>Analyze India</strong>! Your subscription is now active, and you're officially part of a community driven by data, intelligence, and innovation.</p>
+    <p>You will now receive:</p>
+    <ul>
+        <li>AI-powered reports tailored to your interests</li>
+        <li>Deep insights into trends shaping India</li>
+        <li>Exclusive early access to upcoming tools and features</li>
+    </ul>
 
-            <p>You will now receive:</p>
-            <ul>
-                <li>AI-powered reports tailored to your interests</li>
-                <li>Deep insights into trends shaping India</li>
-                <li>Exclusive early access to upcoming tools and features</li>
-            </ul>
+    <p>Welcome aboard—let’s decode the future together!</p>
 
-            <p>Welcome aboard—let’s decode the future together!</p>
+    <p>Warm regards,<br>
+    <strong>The Analyze India Team</strong></p>
 
-            <p>Warm regards,<br>
-            <strong>The Analyze India Team</strong></p>
+    <p style="font-size:12px; color:#777;">
+    This is an automated system-generated email. Please do not reply.
+    </p>
+"""
 
-            <p style="font-size:12px; color:#777;">
-            This is an automated system-generated email. Please do not reply.
-            </p>
-        """,
+
+async def deliver_welcome_email(recipient_email: str):
+    """Sends the welcome email, letting SMTP errors propagate so callers can retry."""
+    message = MessageSchema(
+        subject="Welcome to Analyze India 🚀 — Your Insights Start Now!",
+        recipients=[recipient_email],
+        body=WELCOME_BODY,
         subtype="html",
     )
+    await fm.send_message(message)
+    logger.info("Welcome email sent to %s", recipient_email)
+
+
+async def send_welcome_email(recipient_email: str):
+    if not fm:
+        logger.warning("Skipping email send because ConnectionConfig is not configured.")
+        return
 
     try:
-        fm = FastMail(conf)
-        await fm.send_message(message)
-        logger.info("Welcome email sent to %s", recipient_email)
+        await deliver_welcome_email(recipient_email)
     except Exception as e:
         logger.exception("Failed to send welcome email to %s: %s", recipient_email, e)
 
 
+# --- Celery mail queue (optional) ---
+# Run the worker with: celery -A main.celery_app worker -Q mail --concurrency=8
+celery_app = None
+if Celery and REDIS_URL:
+    celery_app = Celery("mailer", broker=REDIS_URL)
+
+    # only transient connection/timeout failures are retried (with exponential backoff);
+    # permanent ones such as a refused recipient fail the task straight away
+    TRANSIENT_MAIL_ERRORS = (
+        ConnectionErrors,
+        aiosmtplib.SMTPConnectError,
+        aiosmtplib.SMTPServerDisconnected,
+        aiosmtplib.SMTPTimeoutError,
+        ConnectionError,
+        TimeoutError,
+    )
+
+    @celery_app.task(queue="mail", autoretry_for=TRANSIENT_MAIL_ERRORS, retry_backoff=True, max_retries=5)
+    def send_welcome_email_task(recipient_email: str):
+        if not fm:
+            logger.warning("Skipping email send because ConnectionConfig is not configured.")
+            return
+        asyncio.run(deliver_welcome_email(recipient_email))
+
+    logger.info("Celery mail queue enabled.")
+else:
+    logger.info("Celery/REDIS_URL not configured; welcome emails will use BackgroundTasks.")
+
+
 # --- API Endpoints & Startup ---
 @app.on_event("startup")
 async def on_startup():
     # create DB tables
-    create_db_and_tables()
+    await create_db_and_tables()
+
+    # cache the frontend once instead of reading it from disk on every request
+    try:
+        with open("static/index.html", "rb") as f:
+            app.state.index_html = f.read()
+    except FileNotFoundError:
+        app.state.index_html = b"<h1>Frontend File Not Found!</h1><p>Please ensure 'index.html' is in a 'static' directory.</p>"
 
     # prepare shared queue for tweets
-    app.state.tweet_queue = asyncio.Queue()
+    app.state.tweet_queue = asyncio.Queue(maxsize=TWEET_QUEUE_SIZE)
 
     # start broadcaster background task
     asyncio.create_task(tweet_broadcaster(app.state.tweet_queue))
@@ -196,34 +257,47 @@ async def on_startup():
         asyncio.create_task(simulate_tweets(app.state.tweet_queue))
 
 
+@app.on_event("shutdown")
+async def on_shutdown():
+    # close pooled connections so SQLite gets its PRAGMA optimize pass
+    await engine.dispose()
+
+
 @app.get("/", response_class=HTMLResponse)
 async def serve_frontend():
-    try:
-        with open("static/index.html", "r", encoding="utf-8") as f:
-            return HTMLResponse(content=f.read())
-    except FileNotFoundError:
-        return HTMLResponse("<h1>Frontend File Not Found!</h1><p>Please ensure 'index.html' is in a 'static' directory.</p>")
+    return HTMLResponse(content=app.state.index_html)
 
 
 @app.post("/api/subscribe/")
-async def subscribe_user(email: dict, background_tasks: BackgroundTasks, db: Session = Depends(get_session)):
+async def subscribe_user(email: dict, background_tasks: BackgroundTasks, db: AsyncSession = Depends(get_session)):
     user_email = email.get('email')
     if not user_email:
         raise HTTPException(status_code=422, detail="Email is required.")
 
     try:
-        existing = db.exec(select(Subscriber).where(Subscriber.email == user_email)).first()
-        if existing:
+        # the unique index on email rejects duplicates, so no pre-check SELECT is needed
+        try:
+            db.add(Subscriber(email=user_email))
+            await db.commit()
+        except IntegrityError as e:
+            await db.rollback()
+            # only a unique-constraint violation means a duplicate; anything else is a real error
+            if "unique" not in str(e.orig).lower():
+                raise
             raise HTTPException(status_code=400, detail="Email already subscribed.")
 
-        new_subscriber = Subscriber(email=user_email)
-        db.add(new_subscriber)
-        db.commit()
-        db.refresh(new_subscriber)
-
-        # send welcome email in background if configured
+        # send welcome email via the celery worker, or in background if no queue is configured
         if conf:
-            background_tasks.add_task(send_welcome_email, user_email)
+            queued = False
+            if celery_app is not None:
+                try:
+                    # publishing to the broker blocks, so keep it off the event loop
+                    await run_in_threadpool(send_welcome_email_task.delay, user_email)
+                    queued = True
+                except Exception as e:
+                    logger.warning("Could not queue welcome email for %s (%s); sending in background.", user_email, e)
+            if not queued:
+                background_tasks.add_task(send_welcome_email, user_email)
         else:
             logger.info("Subscription created but email not sent (email not configured).")
 
@@ -248,26 +322,44 @@ class TweetManager:
     def disconnect(self, websocket: WebSocket):
         self.active.discard(websocket)
 
-    async def broadcast(self, message: dict):
-        text = json.dumps(message)
-        remove = []
-        for ws in list(self.active):
-            try:
-                await ws.send_text(text)
-            except Exception:
-                remove.append(ws)
-        for ws in remove:
-            self.disconnect(ws)
+    async def broadcast(self, data: bytes):
+        # send to all clients concurrently; drop any socket whose send failed
+        clients = list(self.active)
+        results = await asyncio.gather(*(ws.send_bytes(data) for ws in clients), return_exceptions=True)
+        for ws, result in zip(clients, results):
+            if isinstance(result, Exception):
+                self.disconnect(ws)
 
 
 tweet_manager = TweetManager()
 
 
+TWEET_BATCH_SIZE = 50
+TWEET_QUEUE_SIZE = 1000
+
+
+def enqueue_tweet(queue: asyncio.Queue, msg: bytes):
+    # bounded queue: when consumers fall behind, drop the oldest tweet so the feed stays fresh
+    try:
+        queue.put_nowait(msg)
+    except asyncio.QueueFull:
+        logger.warning("Tweet queue full; dropping oldest tweet (backpressure).")
+        queue.get_nowait()
+        queue.put_nowait(msg)
+
+
 async def tweet_broadcaster(queue: asyncio.Queue):
     while True:
-        msg = await queue.get()
+        # wait for one tweet, then drain whatever else is already queued into the same frame;
+        # producers queue pre-encoded JSON, so the batch is joined rather than re-serialized
+        batch = [await queue.get()]
+        try:
+            while len(batch) < TWEET_BATCH_SIZE:
+                batch.append(queue.get_nowait())
+        except asyncio.QueueEmpty:
+            pass
         try:
-            await tweet_manager.broadcast(msg)
+            await tweet_manager.broadcast(b'{"tweets":[' + b",".join(batch) + b']}')
         except Exception as e:
             logger.exception("Error broadcasting tweet: %s", e)
 
@@ -276,8 +368,8 @@ async def simulate_tweets(queue: asyncio.Queue):
     counter = 1
     while True:
         await asyncio.sleep(2)
-        fake = {"id": f"sim-{counter}", "user": "@simulator", "text": f"Simulated tweet #{counter}", "sentiment": "Neutral"}
-        await queue.put(fake)
+        fake = orjson.dumps({"id": f"sim-{counter}", "user": "@simulator", "text": f"Simulated tweet #{counter}", "sentiment": "Neutral"})
+        enqueue_tweet(queue, fake)
         counter += 1
 
 
@@ -289,8 +381,8 @@ def start_twitter_stream(loop: asyncio.AbstractEventLoop, queue: asyncio.Queue,
     class MyStream(tweepy.StreamingClient):
         def on_tweet(self, tweet):
             try:
-                msg = {"id": tweet.id, "text": tweet.text}
-                loop.call_soon_threadsafe(queue.put_nowait, msg)
+                msg = orjson.dumps({"id": tweet.id, "text": tweet.text})
+                loop.call_soon_threadsafe(enqueue_tweet, queue, msg)
             except Exception as ex:
                 logger.exception("Error in tweet callback: %s", ex)
 
@@ -306,9 +398,11 @@ async def websocket_tweets(ws: WebSocket):
     await tweet_manager.connect(ws)
     try:
         while True:
-            # receive pings from client (we ignore content)
-            await ws.receive_text()
-    except Exception:
+            # receive pings from client (we ignore content) until it closes
+            message = await ws.receive()
+            if message["type"] == "websocket.disconnect":
+                break
+    finally:
         tweet_manager.disconnect(ws)
 
 
@@ -316,3 +410,10 @@ async def websocket_tweets(ws: WebSocket):
 async def health_check():
     return {"status": "ok"}
 
+
+# Local run: uvloop event loop + httptools parser (both from uvicorn[standard]).
+# In production: gunicorn -k uvicorn.workers.UvicornWorker main:app, which also picks them up.
+if __name__ == "__main__":
+    import uvicorn
+
+    uvicorn.run("main:app", host="127.0.0.1", port=8000, loop="uvloop", http="httptools")